@@ -12,59 +12,96 @@ Setup:
      TELEGRAM_BOT_TOKEN=...
      TELEGRAM_CHAT_ID=...
      (optional) POLL_SECONDS=60
+     (optional) MAX_POLL_SECONDS=300
      (optional) STARTUP_MESSAGE="Monitor gestartet"
      (optional) STARTUP_IMAGE_URL=https://example.com/test.jpg
      (optional) SEEN_LIMIT=5000
+     (optional) ENABLE_HTML_FALLBACK=1
   3) python mydealz_monitor.py
 
 Notes:
   - Respects already seen comment IDs across runs (creates state.json).
+  - Reads comments from the MyDealz GraphQL API; the deal page is only scraped
+    (lxml/BeautifulSoup, imported lazily) when GraphQL fails.
   - Detects inline <img> and image links in comments.
   - Builds a direct anchor link to the comment: <deal_url>#comment-<id>
   - Uses a desktop User-Agent and simple backoff.
+  - Doubles the poll interval (up to MAX_POLL_SECONDS) while no new comments
+    arrive and resets it to POLL_SECONDS on the next hit.
 """
+from __future__ import annotations
+
 import os
 import time
-import json
+import asyncio
 import re
 import html
+import hashlib
 import logging
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from functools import lru_cache
+from html.parser import HTMLParser
 from urllib.parse import urljoin, urlparse
-from typing import Optional
-import requests
-from bs4 import BeautifulSoup, Tag
+from typing import Optional, TYPE_CHECKING
+import aiohttp
+import orjson
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from lxml.html import HtmlElement
+
 load_dotenv()
 
 DEAL_URL = os.getenv("DEAL_URL", "").strip()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "").strip()
 POLL_SECONDS = int(os.getenv("POLL_SECONDS", "60"))
+MAX_POLL_SECONDS = max(POLL_SECONDS, int(os.getenv("MAX_POLL_SECONDS", "300")))
 STATE_PATH = os.getenv("STATE_PATH", "state.json")
 STARTUP_MESSAGE = os.getenv("STARTUP_MESSAGE", "").strip()
 STARTUP_IMAGE_URL = os.getenv("STARTUP_IMAGE_URL", "").strip()
 SEEN_LIMIT = int(os.getenv("SEEN_LIMIT", "5000"))
 GRAPHQL_PAGE_LIMIT = int(os.getenv("GRAPHQL_PAGE_LIMIT", "50"))
 THREAD_ID = os.getenv("THREAD_ID", "").strip()
+ENABLE_HTML_FALLBACK = os.getenv("ENABLE_HTML_FALLBACK", "1").strip().lower() not in ("0", "false", "no", "off")
 
-if not DEAL_URL or not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-    raise SystemExit("Please set DEAL_URL, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID in your .env")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s"
-)
-
-session = requests.Session()
-session.headers.update({
+HTTP_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36",
     "Accept-Language": "de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8"
-})
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+    # aiohttp decodes br transparently when the Brotli package is installed.
+    "Accept-Encoding": "gzip, deflate, br",
+}
+
+# Shared aiohttp session, opened in main_async() and reused for every request.
+session: Optional[aiohttp.ClientSession] = None
+# Bounds concurrent Bot API requests to stay within the per-chat rate limit;
+# held around each POST in telegram_request, not across retry back-off.
+TELEGRAM_SEMAPHORE = asyncio.Semaphore(4)
+# sendMediaGroup accepts between 2 and 10 photos per album.
+TELEGRAM_MEDIA_GROUP_LIMIT = 10
+# sendPhoto errors meaning Telegram could not download the URL itself
+# (hotlink protection, referrer checks); those photos get uploaded instead.
+TELEGRAM_URL_FETCH_ERRORS = ("wrong file identifier", "failed to get http url content")
+# Rate limits and transient server errors are retried with backoff
+# (honouring retry_after on 429) instead of pausing after every send.
+TELEGRAM_RETRY_STATUSES = {429, 500, 502, 503, 504}
+TELEGRAM_MAX_RETRIES = 3
 
 IMAGE_EXT_RE = re.compile(r'\.(?:jpg|jpeg|png|gif|webp)\b', re.I)
+IMAGE_EXTENSIONS = frozenset({"jpg", "jpeg", "png", "gif", "webp"})
+DIGITS_RE = re.compile(r'\d+')
+TAIL_DIGITS_RE = re.compile(r'(\d+)\D*\Z')
+TAG_RE = re.compile(r'<[A-Za-z/!?][^>]*>')
+# An attribute value containing '>', which TAG_RE would end the tag at. A
+# quote-aware TAG_RE goes quadratic on unterminated quotes; this stays linear.
+QUOTED_GT_RE = re.compile(r'''=\s*(?:"[^"]*>|'[^']*>)''')
+PRELOADED_STATE_ANCHOR = "window.__PRELOADED_STATE__"
+# Characters that matter when walking a JSON object literal.
+JSON_STRUCTURE_RE = re.compile(r'[{}"\\]')
 THREAD_ID_HTML_PATTERNS = [
     re.compile(r'\"threadId\"\s*:\s*\"?(?P<id>\d+)\"?', re.I),
     re.compile(r'data-thread-id=[\"\'](?P<id>\d+)[\"\']', re.I),
@@ -74,11 +111,88 @@ CANONICAL_LINK_RE = re.compile(
     re.I,
 )
 
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+COMMENT_CANDIDATES_XPATH = (
+    "//article[@data-comment-id]"
+    f" | //div[{_has_class('comment-padding')}]"
+    f" | //li[{_has_class('commentList-item')}][@data-id]"
+    f" | //div[{_has_class('commentList-comment')}][@data-t]"
+)
+COMMENT_AUTHOR_XPATHS = (
+    f".//*[{_has_class('user')}]",
+    f".//*[{_has_class('user-name')}]",
+    ".//*[@data-user-name]",
+    f".//*[{_has_class('comment-header')}]//a",
+)
+COMMENT_TEXT_XPATHS = tuple(
+    f".//*[{_has_class(name)}]"
+    for name in (
+        "comment__body",
+        "comment-body",
+        "comment-content",
+        "comment-body__content",
+        "commentList-body",
+    )
+)
+COMMENT_PADDING_XPATH = f".//div[{_has_class('comment-padding')}]"
+PRELOADED_STATE_SCRIPT_XPATH = f"//script[contains(., '{PRELOADED_STATE_ANCHOR}')]/text()"
+
+# Field names tried, in order, on comment entities in the preloaded state.
+PRELOADED_ID_KEYS = ("id", "commentId", "commentID")
+PRELOADED_AUTHOR_KEYS = ("authorName", "userName", "username", "name")
+PRELOADED_USER_KEYS = ("name", "username", "displayName")
+PRELOADED_TEXT_KEYS = ("content", "body", "text")
+PRELOADED_TS_KEYS = ("createdAt", "timestamp", "dateCreated")
+PRELOADED_MEDIA_KEYS = ("media", "sharedMedia", "attachments", "images")
+PRELOADED_URL_KEYS = ("url", "src", "image", "imageUrl", "path")
+PLAIN_TEXT_KEYS = ("text", "body", "content", "html", "value")
+
+@lru_cache(maxsize=None)
+def compiled_xpath(expr: str):
+    """Compile an XPath expression once; lxml is only imported when the HTML fallback runs."""
+    from lxml import etree
+    return etree.XPath(expr, smart_strings=False)
+
+def first_value(mapping: dict, keys):
+    """Return the first truthy mapping[key] for key in keys, or None."""
+    get = mapping.get
+    for key in keys:
+        value = get(key)
+        if value:
+            return value
+    return None
+
+def append_unique(items: list, seen: set, item) -> None:
+    """Append item unless it is already in seen; keeps list and set in step."""
+    if item not in seen:
+        seen.add(item)
+        items.append(item)
+
+def dedupe(items):
+    """Drop repeated items, keeping first-seen order."""
+    seen = set()
+    unique = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique.append(item)
+    return unique
+
+def is_image_url(url: str) -> bool:
+    """Check the extension at the end of the URL path; the regex only scans query/fragment."""
+    path = url.split("#", 1)[0].split("?", 1)[0]
+    if path.rpartition(".")[2].lower() in IMAGE_EXTENSIONS:
+        return True
+    # e.g. proxy links like ...?url=https://host/pic.jpg
+    return len(path) < len(url) and IMAGE_EXT_RE.search(url, len(path)) is not None
+
 def extract_thread_id_from_url(url: str) -> str:
     if not url:
         return ""
     path = urlparse(url).path
-    digits = re.findall(r'(\d+)', path)
+    digits = DIGITS_RE.findall(path)
     return digits[-1] if digits else ""
 
 def extract_thread_id_from_html(html_text: str, base_url: str) -> str:
@@ -90,7 +204,7 @@ def extract_thread_id_from_html(html_text: str, base_url: str) -> str:
                 match = next((m for m in match if m), "")
             if match:
                 candidates.append(str(match))
-    unique = list(dict.fromkeys(candidates))
+    unique = dedupe(candidates)
     if len(unique) == 1:
         return unique[0]
     canonical_match = CANONICAL_LINK_RE.search(html_text)
@@ -99,54 +213,99 @@ def extract_thread_id_from_html(html_text: str, base_url: str) -> str:
         return extract_thread_id_from_url(canonical_url)
     return ""
 
-def resolve_thread_id_from_page(url: str) -> str:
+async def resolve_thread_id_from_page(url: str) -> str:
     try:
-        response = session.get(url, timeout=30)
-        response.raise_for_status()
-    except requests.RequestException as exc:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            final_url = str(response.url)
+            html_text = await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
         logging.warning("Failed to fetch %s to resolve thread ID: %s", url, exc)
         return ""
-    resolved = extract_thread_id_from_url(response.url)
+    resolved = extract_thread_id_from_url(final_url)
     if resolved:
         return resolved
-    return extract_thread_id_from_html(response.text, url)
+    return extract_thread_id_from_html(html_text, url)
 
 BASE_DEAL_URL = DEAL_URL.split("#")[0]
-session.headers["Referer"] = BASE_DEAL_URL
 
-if not THREAD_ID:
-    THREAD_ID = extract_thread_id_from_url(BASE_DEAL_URL)
+async def bootstrap():
+    """Resolve THREAD_ID once at startup (needs the HTTP session, so not at import)."""
+    global THREAD_ID
+    if not THREAD_ID:
+        THREAD_ID = extract_thread_id_from_url(BASE_DEAL_URL)
 
-if not THREAD_ID:
-    THREAD_ID = resolve_thread_id_from_page(BASE_DEAL_URL)
-    if THREAD_ID:
-        logging.info("Resolved thread ID via page fetch: %s", THREAD_ID)
+    if not THREAD_ID:
+        THREAD_ID = await resolve_thread_id_from_page(BASE_DEAL_URL)
+        if THREAD_ID:
+            logging.info("Resolved thread ID via page fetch: %s", THREAD_ID)
 
-if not THREAD_ID:
-    raise SystemExit("Could not determine thread ID. Set THREAD_ID in .env or use a DEAL_URL ending with -<id>.")
+    if not THREAD_ID:
+        raise SystemExit("Could not determine thread ID. Set THREAD_ID in .env or use a DEAL_URL ending with -<id>.")
 
 GRAPHQL_ENDPOINT = "https://www.mydealz.de/graphql"
+
+def create_http_session() -> aiohttp.ClientSession:
+    return aiohttp.ClientSession(
+        headers={**HTTP_HEADERS, "Referer": BASE_DEAL_URL},
+        # DNS answers and keep-alive sockets both outlive a poll interval, so
+        # a quiet poll goes straight to an open connection.
+        connector=aiohttp.TCPConnector(limit=16, keepalive_timeout=300, ttl_dns_cache=300),
+        timeout=aiohttp.ClientTimeout(total=30),
+    )
+
+def get_cookie(name: str) -> str:
+    for cookie in session.cookie_jar:
+        if cookie.key == name:
+            return cookie.value
+    return ""
+
 def load_state():
     state = {"seen_comment_ids": []}
     if os.path.exists(STATE_PATH):
         try:
-            with open(STATE_PATH, "r", encoding="utf-8") as f:
-                loaded = json.load(f)
+            with open(STATE_PATH, "rb") as f:
+                loaded = orjson.loads(f.read())
             if isinstance(loaded, dict):
                 state.update(loaded)
         except Exception:
             logging.warning("state.json unreadable, starting fresh")
-    seen = state.get("seen_comment_ids")
+    seen = state.pop("seen_comment_ids", None)
     if not isinstance(seen, list):
-        state["seen_comment_ids"] = []
+        seen = []
+    # In memory the seen IDs live in a bounded deque (FIFO eviction) plus a set
+    # for O(1) membership; save_state writes the deque back as a plain list.
+    # IDs are compared as strings, so older state files with numeric IDs still match;
+    # deduping after the conversion keeps [123, "123"] from leaving a stale copy
+    # in the deque that would later evict the ID from the set.
+    state["_seen_deque"] = deque(
+        dedupe(str(cid) for cid in seen if cid),
+        maxlen=SEEN_LIMIT if SEEN_LIMIT > 0 else None,
+    )
+    state["_seen_set"] = set(state["_seen_deque"])
     return state
 
 def save_state(state):
+    payload = {k: v for k, v in state.items() if not k.startswith("_")}
+    payload["seen_comment_ids"] = list(state["_seen_deque"])
+    data = orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
     tmp = STATE_PATH + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    # fsync before the rename so a crash never leaves a truncated state.json behind.
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
     os.replace(tmp, STATE_PATH)
 
+async def flush_state(state):
+    """Write state.json once per poll, off the event loop, and only if it changed."""
+    if state.pop("_dirty", False):
+        await asyncio.to_thread(save_state, state)
+
 def comment_sort_key(comment):
     created_ts = comment.get("created_ts")
     if created_ts is not None:
@@ -155,24 +314,88 @@ def comment_sort_key(comment):
         except (TypeError, ValueError):
             pass
     cid = str(comment.get("id", ""))
-    digits = re.findall(r"\d+", cid)
-    if digits:
-        try:
-            return int(digits[-1])
-        except ValueError:
-            pass
+    # MyDealz comment IDs are plain numbers; only odd ones need the regex.
+    if cid.isdecimal():
+        return int(cid)
+    match = TAIL_DIGITS_RE.search(cid)
+    if match:
+        return int(match.group(1))
     return cid
 
 
+@dataclass(slots=True)
+class CommentBatch:
+    """Comments stored column-wise; index i across all columns is one comment."""
+    ids: list[str] = field(default_factory=list)
+    # Creation timestamp, or the numeric comment ID for scraped comments
+    # without one; only used for ordering.
+    created_ts: array = field(default_factory=lambda: array("q"))
+    authors: list[str] = field(default_factory=list)
+    timestamps: list[str] = field(default_factory=list)
+    texts: list[str] = field(default_factory=list)
+    images: list[list[str]] = field(default_factory=list)
+    # Id-only entries the HTML fallback did not scrape because they were seen;
+    # never notified, even once their ID drops out of the seen set.
+    skipped: list[bool] = field(default_factory=list)
+
+    @classmethod
+    def from_comments(cls, comments) -> "CommentBatch":
+        batch = cls()
+        for comment in comments:
+            batch.append(comment)
+        return batch
+
+    def append(self, comment):
+        sort_key = comment_sort_key(comment)
+        self.ids.append(comment["id"])
+        self.created_ts.append(sort_key if isinstance(sort_key, int) else 0)
+        self.authors.append(comment.get("author") or "")
+        self.timestamps.append(comment.get("timestamp") or "")
+        self.texts.append(comment.get("text") or "")
+        self.images.append(comment.get("images") or [])
+        self.skipped.append(bool(comment.get("skipped")))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def sorted_indices(self, indices=None) -> list[int]:
+        if indices is None:
+            indices = range(len(self.ids))
+        return sorted(indices, key=self.created_ts.__getitem__)
+
+    def take(self, indices) -> "CommentBatch":
+        return CommentBatch(
+            ids=[self.ids[i] for i in indices],
+            created_ts=array("q", (self.created_ts[i] for i in indices)),
+            authors=[self.authors[i] for i in indices],
+            timestamps=[self.timestamps[i] for i in indices],
+            texts=[self.texts[i] for i in indices],
+            images=[self.images[i] for i in indices],
+            skipped=[self.skipped[i] for i in indices],
+        )
+
+    def comment(self, i) -> dict:
+        return {
+            "id": self.ids[i],
+            "author": self.authors[i],
+            "text": self.texts[i],
+            "timestamp": self.timestamps[i],
+            "images": self.images[i],
+        }
+
+
 def append_seen(state, cid):
     if not cid:
         return
-    seen = state.setdefault("seen_comment_ids", [])
-    if cid in seen:
+    seen_set = state["_seen_set"]
+    if cid in seen_set:
         return
-    seen.append(cid)
-    if SEEN_LIMIT > 0 and len(seen) > SEEN_LIMIT:
-        del seen[:-SEEN_LIMIT]
+    seen_deque = state["_seen_deque"]
+    if seen_deque.maxlen is not None and len(seen_deque) == seen_deque.maxlen:
+        seen_set.discard(seen_deque[0])
+    seen_deque.append(cid)
+    seen_set.add(cid)
+    state["_dirty"] = True
 
 
 GRAPHQL_COMMENTS_QUERY = """
@@ -189,61 +412,147 @@ query Comments($threadId: ID!, $page: Int, $limit: Int) {
 }
 """
 
-def ensure_xsrf_token() -> str:
-    token = session.cookies.get("xsrf_t")
-    if token:
-        return token.strip('"')
-    resp = session.get(BASE_DEAL_URL, timeout=30)
-    resp.raise_for_status()
-    token = session.cookies.get("xsrf_t")
+# Same window as GRAPHQL_COMMENTS_QUERY but IDs only: idle polls skip the
+# comment bodies and only hydrate via the full query when something is new.
+GRAPHQL_COMMENT_IDS_QUERY = """
+query CommentsIndex($threadId: ID!, $page: Int, $limit: Int) {
+  comments(filter: {threadId: {eq: $threadId}}, page: $page, limit: $limit) {
+    items {
+      commentId
+    }
+  }
+}
+"""
+
+# The xsrf token only changes when MyDealz rotates the session, so it is cached
+# and refreshed after XSRF_TOKEN_TTL seconds or when GraphQL answers 401/403.
+XSRF_TOKEN_TTL = 3600
+xsrf_cache = {"token": None, "expires": 0.0}
+
+async def ensure_xsrf_token(refresh: bool = False) -> str:
+    if not refresh and xsrf_cache["token"] and time.monotonic() < xsrf_cache["expires"]:
+        return xsrf_cache["token"]
+    token = "" if refresh else get_cookie("xsrf_t")
+    if not token:
+        async with session.get(BASE_DEAL_URL) as resp:
+            resp.raise_for_status()
+        token = get_cookie("xsrf_t")
     if not token:
         raise RuntimeError("Could not obtain xsrf token from MyDealz")
-    return token.strip('"')
-
-def graphql_query(query: str, variables: dict, operation_name: Optional[str] = None) -> dict:
-    token = ensure_xsrf_token()
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "Referer": BASE_DEAL_URL,
-        "X-Requested-With": "XMLHttpRequest",
-        "X-XSRF-Token": token,
-    }
+    xsrf_cache["token"] = token.strip('"')
+    xsrf_cache["expires"] = time.monotonic() + XSRF_TOKEN_TTL
+    return xsrf_cache["token"]
+
+async def graphql_query(query: str, variables: dict, operation_name: Optional[str] = None) -> dict:
     payload = {"query": query, "variables": variables}
     if operation_name:
         payload["operationName"] = operation_name
-    response = session.post(GRAPHQL_ENDPOINT, json=payload, headers=headers, timeout=30)
-    response.raise_for_status()
+    for attempt in range(2):
+        token = await ensure_xsrf_token(refresh=attempt > 0)
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Referer": BASE_DEAL_URL,
+            "X-Requested-With": "XMLHttpRequest",
+            "X-XSRF-Token": token,
+        }
+        async with session.post(GRAPHQL_ENDPOINT, json=payload, headers=headers) as response:
+            if response.status in (401, 403) and attempt == 0:
+                logging.info("GraphQL rejected the xsrf token (%s), refreshing it.", response.status)
+                xsrf_cache["token"] = None
+                continue
+            response.raise_for_status()
+            body = await response.read()
+        break
     try:
-        data = response.json()
-    except ValueError as exc:
-        snippet = response.text[:200]
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError as exc:
+        snippet = body[:200].decode("utf-8", "replace")
         raise RuntimeError(f"Invalid GraphQL response: {snippet}") from exc
     errors = data.get("errors") or []
     if errors:
         raise RuntimeError(f"GraphQL error: {errors}")
     return data.get("data") or {}
 
+class TextExtractor(HTMLParser):
+    """Collect the text nodes of an HTML snippet; entities are decoded by the parser."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        # Tags separate words, like TAG_RE's replacement with a space.
+        self.parts.append(" ")
+
+    def handle_endtag(self, tag):
+        self.parts.append(" ")
+
+    def text(self, markup: str) -> str:
+        self.parts = []
+        self.reset()
+        self.feed(markup)
+        self.close()
+        return " ".join("".join(self.parts).split())
+
+text_extractor = TextExtractor()
+
+@lru_cache(maxsize=8192)
+def html_to_text(markup: str) -> str:
+    """Strip tags and entities from a short HTML snippet without building a parse tree."""
+    if "<" not in markup and "&" not in markup:
+        return " ".join(markup.split())
+    stripped = TAG_RE.sub(" ", markup)
+    if "<" in stripped or QUOTED_GT_RE.search(markup):
+        # Unbalanced markup (stray '<', comments) or a '>' inside a quoted
+        # attribute: the stdlib tokenizer copes without building a tree; lxml
+        # is the last resort.
+        try:
+            return text_extractor.text(markup)
+        except Exception:
+            from lxml import html as lxml_html
+            fragment = lxml_html.fragment_fromstring(markup, create_parent=True)
+            return " ".join(fragment.text_content().split())
+    return " ".join(html.unescape(stripped).split())
+
 def parse_comment_content(html_content: str) -> tuple[str, list[str]]:
     if not html_content:
         return "", []
-    soup = BeautifulSoup(html_content, "html.parser")
-    text = soup.get_text(" ", strip=True)
+    is_short = len(html_content) < 1024
+    lowered = html_content.lower()
+    if is_short and "<img" not in lowered and "<a" not in lowered:
+        return html_to_text(html_content), []
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, "lxml")
+    text = html_to_text(html_content) if is_short else soup.get_text(" ", strip=True)
     images: list[str] = []
-    for img in soup.find_all("img"):
-        src = img.get("src") or img.get("data-src") or img.get("data-lazy") or ""
-        if not src and img.get("srcset"):
-            first = img["srcset"].split(',')[0].strip().split(' ')[0]
-            src = first
-        if src and IMAGE_EXT_RE.search(src):
-            images.append(urljoin(DEAL_URL, src))
-    for anchor in soup.find_all("a", href=True):
-        href = anchor["href"]
-        if IMAGE_EXT_RE.search(href):
-            images.append(urljoin(DEAL_URL, href))
-    images = list(dict.fromkeys(images))
+    linked: list[str] = []
+    seen_img: set[str] = set()
+    for tag in soup.find_all(["img", "a"]):
+        if tag.name == "a":
+            href = tag.get("href")
+            if href and is_image_url(href):
+                linked.append(urljoin(DEAL_URL, href))
+            continue
+        src = tag.get("src") or tag.get("data-src") or tag.get("data-lazy") or ""
+        if not src and tag.get("srcset"):
+            src = tag["srcset"].split(',')[0].strip().split(' ')[0]
+        if src and is_image_url(src):
+            append_unique(images, seen_img, urljoin(DEAL_URL, src))
+    # Linked images go after all <img> sources, even when an <a> wraps its <img>.
+    for url in linked:
+        append_unique(images, seen_img, url)
     return text, images
 
+@lru_cache(maxsize=2048)
+def format_created_ts(created_ts: int) -> str:
+    # Comments in one poll often share the same second; the local-time
+    # conversion stays per timestamp so DST switches are still honoured.
+    return datetime.fromtimestamp(created_ts, tz=timezone.utc).astimezone().isoformat(timespec="seconds")
+
 def normalize_comment_item(item: dict) -> dict:
     comment_id = str(item.get("commentId") or "")
     user = item.get("user") or {}
@@ -258,7 +567,7 @@ def normalize_comment_item(item: dict) -> dict:
     timestamp = item.get("createdAt") or ""
     if created_ts is not None:
         try:
-            timestamp = datetime.fromtimestamp(created_ts, tz=timezone.utc).astimezone().isoformat()
+            timestamp = format_created_ts(created_ts)
         except (OverflowError, OSError, ValueError):
             timestamp = item.get("createdAt") or ""
     text, images = parse_comment_content(item.get("content") or "")
@@ -271,34 +580,66 @@ def normalize_comment_item(item: dict) -> dict:
         "created_ts": created_ts,
     }
 
-def fetch_recent_comments(page: int = 1, limit: Optional[int] = None) -> list[dict]:
+async def fetch_recent_comment_ids(page: int = 1, limit: Optional[int] = None) -> list[str]:
+    limit = limit or GRAPHQL_PAGE_LIMIT
+    variables = {"threadId": THREAD_ID, "page": page, "limit": limit}
+    data = await graphql_query(GRAPHQL_COMMENT_IDS_QUERY, variables, operation_name="CommentsIndex")
+    items = ((data.get("comments") or {}).get("items")) or []
+    return [str(item["commentId"]) for item in items if item.get("commentId")]
+
+async def fetch_recent_comments(
+    page: int = 1,
+    limit: Optional[int] = None,
+    skip_ids=frozenset(),
+    use_graphql: bool = True,
+) -> CommentBatch:
+    """Fetch the newest comments, oldest first.
+
+    skip_ids only affects the HTML fallback: comments listed there come back
+    as id-only entries tagged "skipped" instead of being fully scraped.
+    use_graphql=False goes straight to the HTML fallback, for callers that
+    already saw GraphQL fail during this poll.
+    """
     limit = limit or GRAPHQL_PAGE_LIMIT
 
-    comments: list[dict] = []
-    try:
-        html = fetch_comments_html(BASE_DEAL_URL)
-        comments = extract_comments(html)
-    except Exception as exc:
-        logging.warning("HTML comment scrape failed: %s", exc)
-
-    if not comments:
+    comments = None
+    if use_graphql:
         try:
             variables = {"threadId": THREAD_ID, "page": page, "limit": limit}
-            data = graphql_query(GRAPHQL_COMMENTS_QUERY, variables, operation_name="Comments")
+            data = await graphql_query(GRAPHQL_COMMENTS_QUERY, variables, operation_name="Comments")
             items = ((data.get("comments") or {}).get("items")) or []
             normalized = {}
             for raw in items:
                 comment = normalize_comment_item(raw)
                 if comment.get("id"):
                     normalized[comment["id"]] = comment
-            comments = sorted(normalized.values(), key=comment_sort_key)
+            comments = list(normalized.values())
         except Exception as exc:
             logging.warning("GraphQL comment fetch failed: %s", exc)
-            comments = []
+    if comments is None:
+        if not ENABLE_HTML_FALLBACK:
+            return CommentBatch()
+        # Only scrape (and parse) the full deal page when the API is unavailable.
+        try:
+            fetched = await fetch_comments_html(BASE_DEAL_URL)
+            if fetched is None:
+                logging.info("Deal page unchanged since last scrape.")
+                comments = page_cache["comments"]
+            else:
+                html_text, validators = fetched
+                # The whole list is cached, skipped entries included, so the
+                # limit window on an unchanged page covers the same comments.
+                comments = extract_comments(html_text, skip_ids)
+                page_cache.update(validators, comments=comments)
+        except Exception as exc:
+            logging.warning("HTML comment scrape failed: %s", exc)
+            return CommentBatch()
 
-    if limit and comments:
-        comments = comments[-limit:]
-    return comments
+    batch = CommentBatch.from_comments(comments)
+    order = batch.sorted_indices()
+    if limit:
+        order = order[-limit:]
+    return batch.take(order)
 
 
 def trim_text(text, limit):
@@ -314,22 +655,62 @@ def to_plain_text(value):
     if not value:
         return ""
     if isinstance(value, dict):
-        for key in ("text", "body", "content", "html", "value"):
-            if value.get(key):
-                value = value[key]
-                break
+        value = first_value(value, PLAIN_TEXT_KEYS) or str(value)
+    return html_to_text(str(value))
+
+
+def find_json_object_end(text, start):
+    """Return the index just past the JSON object opening at text[start], or -1."""
+    depth = 0
+    in_string = False
+    escaped_pos = -1
+    for match in JSON_STRUCTURE_RE.finditer(text, start):
+        pos = match.start()
+        if pos == escaped_pos:
+            continue
+        char = match.group()
+        if char == "\\":
+            escaped_pos = pos + 1
+        elif char == '"':
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif char == "{":
+            depth += 1
         else:
-            value = str(value)
-    return BeautifulSoup(str(value), "html.parser").get_text(" ", strip=True)
-
-
-def extract_comments_from_preloaded_state(html_text):
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+    return -1
+
+
+def iter_preloaded_state_json(html_text):
+    """Yield the object literal assigned to each window.__PRELOADED_STATE__ in html_text."""
+    pos = html_text.find(PRELOADED_STATE_ANCHOR)
+    while pos != -1:
+        start = pos + len(PRELOADED_STATE_ANCHOR)
+        rest = html_text[start:start + 64].lstrip()
+        if rest.startswith("=") and rest[1:].lstrip().startswith("{"):
+            start = html_text.index("{", start)
+            end = find_json_object_end(html_text, start)
+            if end != -1:
+                yield html_text[start:end]
+                start = end
+        pos = html_text.find(PRELOADED_STATE_ANCHOR, start)
+
+
+def extract_comments_from_preloaded_state(root: HtmlElement, skip_ids=frozenset()):
+    """Extract comments from the __PRELOADED_STATE__ scripts of an already parsed page."""
     comments = []
-    pattern = re.compile(r"window.__PRELOADED_STATE__\s*=\s*({.*?})\s*;", re.DOTALL)
-    for match in pattern.finditer(html_text):
+    state_jsons = (
+        state_json
+        for script_text in compiled_xpath(PRELOADED_STATE_SCRIPT_XPATH)(root)
+        for state_json in iter_preloaded_state_json(script_text)
+    )
+    for state_json in state_jsons:
         try:
-            data = json.loads(match.group(1))
-        except json.JSONDecodeError:
+            data = orjson.loads(state_json)
+        except orjson.JSONDecodeError:
             continue
         entities = data.get("entities") or {}
         raw_comments = entities.get("comments") or entities.get("comment") or {}
@@ -342,25 +723,26 @@ def extract_comments_from_preloaded_state(html_text):
         for raw in iterable:
             if not isinstance(raw, dict):
                 continue
-            cid = raw.get("id") or raw.get("commentId") or raw.get("commentID")
+            cid = first_value(raw, PRELOADED_ID_KEYS)
             if not cid:
                 continue
             cid = str(cid)
-            author = (
-                raw.get("authorName")
-                or raw.get("userName")
-                or raw.get("username")
-                or raw.get("name")
-            )
-            if not author and isinstance(raw.get("user"), dict):
-                user = raw["user"]
-                author = user.get("name") or user.get("username") or user.get("displayName")
-            text = to_plain_text(raw.get("content") or raw.get("body") or raw.get("text"))
-            ts = raw.get("createdAt") or raw.get("timestamp") or raw.get("dateCreated") or ""
+            if cid in skip_ids:
+                comments.append({"id": cid, "skipped": True})
+                continue
+            raw_get = raw.get
+            author = first_value(raw, PRELOADED_AUTHOR_KEYS)
+            if not author:
+                user = raw_get("user")
+                if isinstance(user, dict):
+                    author = first_value(user, PRELOADED_USER_KEYS)
+            text = to_plain_text(first_value(raw, PRELOADED_TEXT_KEYS))
+            ts = first_value(raw, PRELOADED_TS_KEYS) or ""
             images = []
+            seen_img = set()
             media_sources = []
-            for key in ("media", "sharedMedia", "attachments", "images"):
-                val = raw.get(key)
+            for key in PRELOADED_MEDIA_KEYS:
+                val = raw_get(key)
                 if not val:
                     continue
                 if isinstance(val, dict):
@@ -372,30 +754,28 @@ def extract_comments_from_preloaded_state(html_text):
             for item in media_sources:
                 url = ""
                 if isinstance(item, dict):
-                    url = item.get("url") or item.get("src") or item.get("image") or item.get("imageUrl")
-                    if not url and item.get("path"):
-                        url = item["path"]
+                    url = first_value(item, PRELOADED_URL_KEYS)
                 elif isinstance(item, str):
                     url = item
                 if not url:
                     continue
-                if not IMAGE_EXT_RE.search(url):
+                if not is_image_url(url):
                     continue
-                images.append(urljoin(DEAL_URL, url))
+                append_unique(images, seen_img, urljoin(DEAL_URL, url))
             comments.append(
                 {
                     "id": cid,
                     "author": author or "",
                     "text": text,
                     "timestamp": ts,
-                    "images": list(dict.fromkeys(images)),
+                    "images": images,
                 }
             )
     return comments
 
 
-def find_comment_id(element: Tag) -> str:
-    current: Optional[Tag] = element if isinstance(element, Tag) else None
+def find_comment_id(element: HtmlElement) -> str:
+    current: Optional[HtmlElement] = element
     for _ in range(6):
         if current is None:
             break
@@ -405,16 +785,23 @@ def find_comment_id(element: Tag) -> str:
         elem_id = current.get("id") or ""
         if elem_id.startswith("comment-"):
             return elem_id.split("comment-")[-1]
-        parent = current.parent
-        current = parent if isinstance(parent, Tag) else None
+        current = current.getparent()
     return ""
 
 
-def extract_comments(html_text):
-    soup = BeautifulSoup(html_text, "html.parser")
-    comments = extract_comments_from_dom(soup)
+def element_text(element: HtmlElement) -> str:
+    """Whitespace-normalized text of an element, like BeautifulSoup's get_text(" ", strip=True)."""
+    return " ".join(part.strip() for part in element.itertext() if part.strip())
+
+
+def extract_comments(html_text, skip_ids=frozenset()):
+    if not html_text.strip():
+        return []
+    from lxml import html as lxml_html
+    root = lxml_html.fromstring(html_text)
+    comments = extract_comments_from_dom(root, skip_ids)
     comment_map = {c["id"]: c for c in comments if c.get("id")}
-    fallback_comments = extract_comments_from_preloaded_state(html_text)
+    fallback_comments = extract_comments_from_preloaded_state(root, skip_ids)
     for fb in fallback_comments:
         cid = fb["id"]
         existing = comment_map.get(cid)
@@ -428,48 +815,79 @@ def extract_comments(html_text):
             fb_images = fb.get("images") or []
             if fb_images:
                 merged = (existing.get("images") or []) + fb_images
-                existing["images"] = list(dict.fromkeys(merged))
+                existing["images"] = dedupe(merged)
         else:
             comments.append(fb)
             comment_map[cid] = fb
-    comments.sort(key=comment_sort_key)
+    # Ordering happens in CommentBatch.sorted_indices, whose integer keys never
+    # mix with the str fallback of comment_sort_key.
     return comments
 
 
-def build_comment_message(comment, title="Neuer Kommentar"):
-    anchor = build_comment_link(comment["id"])
-    lines = [
-        f"<b>{html.escape(title)}</b>",
-        f"Autor: {html.escape(comment.get('author') or 'Unbekannt')}",
-        f"Zeit: {html.escape(comment.get('timestamp') or 'Unbekannt')}",
-        f"<a href=\"{html.escape(anchor)}\">Zum Kommentar</a>",
-    ]
-    text = comment.get("text", "").strip()
-    lines.append("")
+@lru_cache(maxsize=4096)
+def _escape_html_cached(value):
+    return html.escape(value)
+
+
+def escape_html(value):
+    # Titles, authors and timestamps repeat across images and comments; long
+    # comment bodies are escaped directly to keep the cache small.
+    if len(value) > 256:
+        return html.escape(value)
+    return _escape_html_cached(value)
+
+
+@lru_cache(maxsize=1024)
+def caption_snippet(text):
+    return trim_text(escape_html(text), 900)
+
+
+def comment_message_fields(comment):
+    """Flatten a comment dict into the hashable arguments of the message builders."""
+    return (
+        comment["id"],
+        comment.get("author") or "",
+        comment.get("timestamp") or "",
+        comment.get("text") or "",
+    )
+
+
+@lru_cache(maxsize=1024)
+def build_comment_header(cid, author, timestamp, title):
+    """Escaped title/author/time/link block shared by a comment's message and image captions."""
+    return "\n".join((
+        f"<b>{escape_html(title)}</b>",
+        f"Autor: {escape_html(author or 'Unbekannt')}",
+        f"Zeit: {escape_html(timestamp or 'Unbekannt')}",
+        f"<a href=\"{escape_html(build_comment_link(cid))}\">Zum Kommentar</a>",
+        "",
+    ))
+
+
+@lru_cache(maxsize=1024)
+def build_comment_message(cid, author, timestamp, text, title="Neuer Kommentar"):
+    lines = [build_comment_header(cid, author, timestamp, title)]
+    text = text.strip()
     if text:
         lines.append("<b>Kommentar:</b>")
-        lines.append(html.escape(text))
+        lines.append(escape_html(text))
     else:
         lines.append("<i>Kein Text im Kommentar</i>")
     return "\n".join(lines)
 
 
-def build_comment_image_caption(comment, idx, total, title):
-    lines = [
-        f"<b>{html.escape(title)}</b>",
-        f"Autor: {html.escape(comment.get('author') or 'Unbekannt')}",
-        f"Zeit: {html.escape(comment.get('timestamp') or 'Unbekannt')}",
-        f"<a href=\"{html.escape(build_comment_link(comment['id']))}\">Zum Kommentar</a>",
-    ]
-    text = comment.get("text", "").strip()
-    lines.append("")
+@lru_cache(maxsize=1024)
+def build_comment_image_caption(cid, author, timestamp, text, idx, total, title, count=1):
+    lines = [build_comment_header(cid, author, timestamp, title)]
+    text = text.strip()
     if text:
-        snippet = trim_text(html.escape(text), 900)
         lines.append("<b>Kommentar:</b>")
-        lines.append(snippet)
+        lines.append(caption_snippet(text))
     else:
         lines.append("<i>Kein Text im Kommentar</i>")
-    if total > 1:
+    if count > 1:
+        lines.append(f"Bilder {idx}-{idx + count - 1}/{total}")
+    elif total > 1:
         lines.append(f"Bild {idx}/{total}")
     caption = "\n".join(lines)
     if len(caption) > 1024:
@@ -477,232 +895,381 @@ def build_comment_image_caption(comment, idx, total, title):
     return caption
 
 
-def send_comment_notification(comment, title="Neuer Kommentar"):
-    message = build_comment_message(comment, title=title)
-    message_ok = send_telegram_message(message)
+async def send_comment_notification(comment, title="Neuer Kommentar"):
+    fields = comment_message_fields(comment)
+    message = build_comment_message(*fields, title=title)
+    message_ok = await send_telegram_message(message)
     images = comment.get("images") or []
+    if not images:
+        return message_ok, 0
+    image_title = f"{title} - Bild"
+    total = len(images)
+
+    async def send_batch(idx, batch):
+        caption = build_comment_image_caption(*fields, idx, total, image_title, count=len(batch))
+        if len(batch) == 1:
+            return int(await send_telegram_photo(batch[0], caption))
+        if await send_telegram_media_group(batch, caption):
+            return len(batch)
+        # One unreachable URL fails the whole album; retry photo by photo, in
+        # order, so "Bild 1/n" still lands before "Bild 2/n".
+        sent = 0
+        for offset, img_url in enumerate(batch):
+            sent += await send_telegram_photo(
+                img_url,
+                build_comment_image_caption(*fields, idx + offset, total, image_title),
+            )
+        return sent
+
+    # Albums go out one after another so "Bilder 1-10" lands before "Bilder 11-...".
     images_sent = 0
-    if images:
-        image_title = f"{title} - Bild"
-        total = len(images)
-        for idx, img_url in enumerate(images, 1):
-            caption = build_comment_image_caption(comment, idx, total, image_title)
-            if send_telegram_photo(img_url, caption):
-                images_sent += 1
-            time.sleep(0.7)
+    for start in range(0, total, TELEGRAM_MEDIA_GROUP_LIMIT):
+        images_sent += await send_batch(start + 1, images[start:start + TELEGRAM_MEDIA_GROUP_LIMIT])
     return message_ok, images_sent
 
-def send_telegram_photo(photo_url, caption):
-    tg_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
+async def telegram_request(method, payload, photo_file=None):
+    """POST to the Bot API and return (ok, status, body); photo_file=(filename, bytes) sends multipart."""
+    tg_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/{method}"
+    for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+        if photo_file is None:
+            request_kwargs = {"json": payload}
+        else:
+            # FormData is consumed by a request, so rebuild it per attempt.
+            form = aiohttp.FormData()
+            for key, value in payload.items():
+                form.add_field(key, str(value))
+            form.add_field("photo", photo_file[1], filename=photo_file[0])
+            request_kwargs = {"data": form}
+        async with TELEGRAM_SEMAPHORE, session.post(tg_url, **request_kwargs) as r:
+            if r.ok:
+                return True, r.status, ""
+            status = r.status
+            body = await r.text()
+        if status not in TELEGRAM_RETRY_STATUSES or attempt == TELEGRAM_MAX_RETRIES:
+            return False, status, body
+        delay = 0.5 * 2 ** attempt
+        if status == 429:
+            try:
+                delay = max(delay, float(orjson.loads(body)["parameters"]["retry_after"]))
+            except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+                pass
+        logging.warning("Telegram %s returned %s, retrying in %.1fs.", method, status, delay)
+        await asyncio.sleep(delay)
+
+async def send_telegram_media_group(photos, caption):
+    media = [
+        {
+            "type": "photo",
+            "media": photo_url,
+            # Telegram shows the first item's caption for the whole album.
+            "caption": caption[:1024] if i == 0 else "",
+            "parse_mode": "HTML",
+        }
+        for i, photo_url in enumerate(photos)
+    ]
+    data = {"chat_id": TELEGRAM_CHAT_ID, "media": media}
+    ok, status, body = await telegram_request("sendMediaGroup", data)
+    if not ok:
+        logging.error("Telegram sendMediaGroup failed: %s | %s", status, body[:300])
+    return ok
+
+async def send_telegram_photo(photo_url, caption):
     data = {
         "chat_id": TELEGRAM_CHAT_ID,
         "photo": photo_url,
         "caption": caption[:1024],  # Telegram limit for caption in sendPhoto
         "parse_mode": "HTML"
     }
-    r = session.post(tg_url, data=data, timeout=30)
-    if not r.ok:
-        logging.error("Telegram sendPhoto failed: %s | %s", r.status_code, r.text[:300])
-    return r.ok
+    ok, status, body = await telegram_request("sendPhoto", data)
+    if ok:
+        return True
+    if status == 400 and any(err in body.lower() for err in TELEGRAM_URL_FETCH_ERRORS):
+        logging.info("Telegram could not fetch %s, uploading it instead.", photo_url)
+        return await upload_telegram_photo(photo_url, caption)
+    logging.error("Telegram sendPhoto failed: %s | %s", status, body[:300])
+    return False
+
+async def upload_telegram_photo(photo_url, caption):
+    try:
+        async with session.get(photo_url, headers={"Referer": BASE_DEAL_URL, "Accept": "image/*"}) as resp:
+            resp.raise_for_status()
+            photo = await resp.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        logging.error("Downloading %s for upload failed: %s", photo_url, exc)
+        return False
+    data = {
+        "chat_id": TELEGRAM_CHAT_ID,
+        "caption": caption[:1024],
+        "parse_mode": "HTML",
+    }
+    filename = os.path.basename(urlparse(photo_url).path) or "photo.jpg"
+    ok, status, body = await telegram_request("sendPhoto", data, photo_file=(filename, photo))
+    if not ok:
+        logging.error("Telegram photo upload failed: %s | %s", status, body[:300])
+    return ok
 
-def send_telegram_message(text):
-    tg_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+async def send_telegram_message(text):
     data = {
         "chat_id": TELEGRAM_CHAT_ID,
         "text": text[:4096],
         "parse_mode": "HTML",
         "disable_web_page_preview": False
     }
-    r = session.post(tg_url, data=data, timeout=30)
-    if not r.ok:
-        logging.error("Telegram sendMessage failed: %s | %s", r.status_code, r.text[:300])
-    return r.ok
-
-def extract_comments_from_dom(soup):
-    """Extract comment entries from the rendered DOM, including comment-padding blocks."""
-    comments = []
-    candidates = []
-    candidates.extend(soup.select("article[data-comment-id]"))
-    candidates.extend(soup.select("div.comment-padding"))
-    candidates.extend(soup.select("li.commentList-item[data-id]"))
-    candidates.extend(soup.select("div.commentList-comment[data-t]"))
+    ok, status, body = await telegram_request("sendMessage", data)
+    if not ok:
+        logging.error("Telegram sendMessage failed: %s | %s", status, body[:300])
+    return ok
 
+def iter_comment_elements(root: HtmlElement):
+    """Yield (comment_id, element) for each comment block in the rendered DOM, once per ID."""
     seen_ids: set[str] = set()
-
-    for el in candidates:
-        if not isinstance(el, Tag):
-            continue
+    for el in compiled_xpath(COMMENT_CANDIDATES_XPATH)(root):
         cid = find_comment_id(el)
         if not cid or cid in seen_ids:
             continue
         seen_ids.add(cid)
+        yield cid, el
+
+
+def build_comment_dict(el: HtmlElement, cid: str) -> dict:
+    """Extract author, text, timestamp and images of one comment block."""
+    article: HtmlElement = el
+    if "comment-padding" not in (article.get("class") or "").split():
+        padding = compiled_xpath(COMMENT_PADDING_XPATH)(article)
+        if padding:
+            article = padding[0]
+    if article.tag != "article":
+        article_node = compiled_xpath(".//article")(article)
+        if article_node:
+            article = article_node[0]
+
+    # Author lookup within the comment block
+    author = ""
+    for xpath in COMMENT_AUTHOR_XPATHS:
+        nodes = compiled_xpath(xpath)(article)
+        if not nodes:
+            continue
+        candidate = nodes[0].get("data-user-name") or element_text(nodes[0])
+        if candidate:
+            author = candidate.strip()
+            break
 
-        content_root: Tag = el
-        if "comment-padding" not in (content_root.get("class") or []):
-            padding = content_root.select_one("div.comment-padding")
-            if isinstance(padding, Tag):
-                content_root = padding
-        if content_root.name != "article":
-            article_node = content_root.select_one("article")
-            if isinstance(article_node, Tag):
-                content_root = article_node
-
-        article = content_root
-
-        # Author lookup within the comment block
-        author = ""
-        for selector in (".user", ".user-name", "[data-user-name]", ".comment-header a"):
-            node = article.select_one(selector)
-            if not node:
-                continue
-            candidate = node.get("data-user-name") or node.get_text(strip=True)
-            if candidate:
-                author = candidate.strip()
+    # Comment text
+    text_value = ""
+    for xpath in COMMENT_TEXT_XPATHS:
+        nodes = compiled_xpath(xpath)(article)
+        if nodes:
+            text_value = element_text(nodes[0])
+            if text_value:
                 break
+    if not text_value:
+        text_value = element_text(article)
+
+    # Timestamp
+    timestamp = ""
+    datetimes = compiled_xpath(".//time/@datetime")(article)
+    if datetimes:
+        timestamp = datetimes[0]
+    else:
+        time_nodes = compiled_xpath(".//time")(article)
+        if time_nodes:
+            timestamp = element_text(time_nodes[0])
+
+    # Images within the comment body: one walk over <img> and <a>, with
+    # <img> sources still listed ahead of linked images.
+    images: list[str] = []
+    linked: list[str] = []
+    seen_img: set[str] = set()
+    for node in article.iter("img", "a"):
+        if node.tag == "a":
+            href = node.get("href")
+            if href and is_image_url(href):
+                linked.append(urljoin(DEAL_URL, href))
+            continue
+        src = node.get("src") or node.get("data-src") or node.get("data-lazy") or ""
+        if not src and node.get("srcset"):
+            src = node.get("srcset").split(",")[0].strip().split(" ")[0]
+        if src and is_image_url(src):
+            append_unique(images, seen_img, urljoin(DEAL_URL, src))
+    for url in linked:
+        append_unique(images, seen_img, url)
+
+    return {
+        "id": cid,
+        "author": author,
+        "text": text_value,
+        "timestamp": timestamp,
+        "images": images,
+    }
 
-        # Comment text
-        text_value = ""
-        for selector in (
-            ".comment__body",
-            ".comment-body",
-            ".comment-content",
-            ".comment-body__content",
-            ".commentList-body",
-        ):
-            node = article.select_one(selector)
-            if node:
-                text_value = node.get_text(" ", strip=True)
-                if text_value:
-                    break
-        if not text_value:
-            text_value = article.get_text(" ", strip=True)
-
-        # Timestamp
-        timestamp = ""
-        time_node = article.select_one("time[datetime]") or article.select_one("time")
-        if time_node:
-            timestamp = time_node.get("datetime") or time_node.get_text(strip=True)
-
-        # Images within the comment body
-        images: list[str] = []
-        for img in article.find_all("img"):
-            src = img.get("src") or img.get("data-src") or img.get("data-lazy") or ""
-            if not src and img.get("srcset"):
-                srcset = img.get("srcset", "")
-                first = srcset.split(",")[0].strip().split(" ")[0]
-                src = first
-            if src and IMAGE_EXT_RE.search(src):
-                images.append(urljoin(DEAL_URL, src))
-
-        for a in article.find_all("a", href=True):
-            href = a["href"]
-            if IMAGE_EXT_RE.search(href):
-                images.append(urljoin(DEAL_URL, href))
-
-        comments.append(
-            {
-                "id": str(cid),
-                "author": author,
-                "text": text_value,
-                "timestamp": timestamp,
-                "images": list(dict.fromkeys(images)),
-            }
-        )
-    return comments
 
-def fetch_comments_html(url):
-    r = session.get(url, timeout=30)
-    r.raise_for_status()
-    return r.text
+def extract_comments_from_dom(root: HtmlElement, skip_ids=frozenset()):
+    """Extract comment entries from the rendered DOM, including comment-padding blocks.
+
+    Comments listed in skip_ids are returned as id-only entries tagged "skipped",
+    so already notified comments keep their place without paying for text and
+    image extraction.
+    """
+    return [
+        {"id": cid, "skipped": True} if cid in skip_ids else build_comment_dict(el, cid)
+        for cid, el in iter_comment_elements(root)
+    ]
+
+# Validators, body digest and parsed comments of the last deal page fetched
+# for the HTML fallback.
+page_cache = {"etag": None, "last_modified": None, "digest": None, "comments": []}
+
+async def fetch_comments_html(url):
+    """Return (html, validators) for the deal page, or None if it is unchanged since the last parse.
+
+    validators holds the ETag, Last-Modified and body digest; the caller stores
+    them in page_cache only once the page parsed, so a failed parse is retried.
+    """
+    headers = {}
+    if page_cache["etag"]:
+        headers["If-None-Match"] = page_cache["etag"]
+    if page_cache["last_modified"]:
+        headers["If-Modified-Since"] = page_cache["last_modified"]
+    async with session.get(url, headers=headers) as r:
+        if r.status == 304:
+            return None
+        r.raise_for_status()
+        body = await r.read()
+        encoding = r.get_encoding()
+        validators = {
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+        }
+    # Servers without validators often still return byte-identical pages.
+    digest = hashlib.blake2b(body, digest_size=16).digest()
+    if digest == page_cache["digest"]:
+        return None
+    validators["digest"] = digest
+    return body.decode(encoding, "replace"), validators
 
 def build_comment_link(cid):
     # pepper anchors typically support #comment-<id>
     return f"{DEAL_URL}#comment-{cid}"
 
-def send_startup_notification(state):
+async def send_startup_notification(state):
     message = STARTUP_MESSAGE or f"Monitoring gestartet: {DEAL_URL}"
-    if send_telegram_message(message):
+    if await send_telegram_message(message):
         logging.info("Startup message sent.")
     else:
         logging.warning("Startup message failed to send.")
     if STARTUP_IMAGE_URL:
-        ok = send_telegram_photo(STARTUP_IMAGE_URL, message)
+        ok = await send_telegram_photo(STARTUP_IMAGE_URL, message)
         if ok:
             logging.info("Startup image sent.")
         else:
             logging.warning("Startup image failed to send.")
 
     try:
-        comments = fetch_recent_comments(limit=GRAPHQL_PAGE_LIMIT)
+        batch = await fetch_recent_comments(limit=GRAPHQL_PAGE_LIMIT)
     except Exception as exc:
         logging.warning("Could not fetch latest comment for startup: %s", exc)
-        return []
+        return CommentBatch()
 
-    if not comments:
+    if not batch:
         logging.info("No comments available to snapshot on startup.")
-        return []
+        return batch
 
-    latest = comments[-1]
-    send_comment_notification(latest, title="Letzter Kommentar beim Start")
+    latest = batch.comment(len(batch) - 1)
+    await send_comment_notification(latest, title="Letzter Kommentar beim Start")
 
-    for comment in comments:
-        append_seen(state, comment["id"])
-    save_state(state)
-    return comments
+    for cid in batch.ids:
+        append_seen(state, cid)
+    await flush_state(state)
+    return batch
 
-def run_once(state, preloaded_comments=None):
+async def run_once(state, preloaded_comments=None):
+    seen_set = state["_seen_set"]
     if preloaded_comments is not None:
-        comments = preloaded_comments
+        batch = preloaded_comments
     else:
-        comments = fetch_recent_comments(limit=GRAPHQL_PAGE_LIMIT)
+        try:
+            recent_ids = await fetch_recent_comment_ids(limit=GRAPHQL_PAGE_LIMIT)
+        except Exception as exc:
+            logging.warning("GraphQL comment index failed: %s", exc)
+            recent_ids = None
+        if recent_ids is not None and all(cid in seen_set for cid in recent_ids):
+            logging.info("No new comments." if recent_ids else "No comments found (yet).")
+            return 0
+        # A failed index means GraphQL is down for this poll; asking it again
+        # (plus an xsrf refresh on 401/403) would only fetch the page twice.
+        batch = await fetch_recent_comments(
+            limit=GRAPHQL_PAGE_LIMIT,
+            skip_ids=seen_set,
+            use_graphql=recent_ids is not None,
+        )
 
-    if not comments:
+    if not batch:
         logging.info("No comments found (yet).")
-        return
+        return 0
 
-    seen = state.setdefault("seen_comment_ids", [])
-    seen_set = set(seen)
-    new_comments = [c for c in comments if c["id"] not in seen_set]
+    new_idx = [
+        i for i, cid in enumerate(batch.ids)
+        if cid not in seen_set and not batch.skipped[i]
+    ]
 
-    if not new_comments:
+    if not new_idx:
         logging.info("No new comments.")
-        return
-
-    new_comments.sort(key=comment_sort_key)
+        return 0
 
     messages_sent = 0
     images_sent = 0
-    for comment in new_comments:
-        message_ok, comment_images_sent = send_comment_notification(comment)
+    for i in batch.sorted_indices(new_idx):
+        message_ok, comment_images_sent = await send_comment_notification(batch.comment(i))
         if message_ok:
             messages_sent += 1
         images_sent += comment_images_sent
-        append_seen(state, comment["id"])
+        append_seen(state, batch.ids[i])
 
-    save_state(state)
+    await flush_state(state)
     logging.info(
         "Processed %d new comments (messages sent: %d, images sent: %d).",
-        len(new_comments),
+        len(new_idx),
         messages_sent,
         images_sent,
     )
+    return len(new_idx)
 
-def main():
+async def main_async():
+    global session
     logging.info("Monitoring: %s", DEAL_URL)
     state = load_state()
-    preloaded = send_startup_notification(state)
-    # After startup snapshot we only act on truly new comments.
-    while True:
-        try:
-            run_once(state, preloaded_comments=preloaded)
-            preloaded = None
-            time.sleep(POLL_SECONDS)
-        except requests.RequestException as e:
-            logging.error("Network error: %s", e)
-            time.sleep(min(180, POLL_SECONDS * 2))
-        except Exception as e:
-            logging.exception("Unexpected error: %s", e)
-            time.sleep(min(180, POLL_SECONDS * 2))
+    async with create_http_session() as session:
+        await bootstrap()
+        preloaded = await send_startup_notification(state)
+        # After startup snapshot we only act on truly new comments.
+        delay = POLL_SECONDS
+        while True:
+            try:
+                startup_pass = preloaded is not None
+                new_count = await run_once(state, preloaded_comments=preloaded)
+                preloaded = None
+                # Back off while the thread is quiet, snap back on the next hit.
+                # The startup snapshot never has new comments, so it does not count.
+                if startup_pass or new_count:
+                    delay = POLL_SECONDS
+                else:
+                    delay = min(delay * 2, MAX_POLL_SECONDS)
+                await asyncio.sleep(delay)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.error("Network error: %s", e)
+                await asyncio.sleep(min(180, POLL_SECONDS * 2))
+            except Exception as e:
+                logging.exception("Unexpected error: %s", e)
+                await asyncio.sleep(min(180, POLL_SECONDS * 2))
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s"
+    )
+    if not DEAL_URL or not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        raise SystemExit("Please set DEAL_URL, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID in your .env")
+    asyncio.run(main_async())
 
 if __name__ == "__main__":
     main()